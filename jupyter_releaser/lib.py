@@ -2,7 +2,6 @@
 # Distributed under the terms of the Modified BSD License.
 import os
 import os.path as osp
-import re
 import shutil
 import sys
 import uuid
@@ -233,8 +232,8 @@ def draft_release(
 
 def delete_release(auth, release_url):
     """Delete a draft GitHub release by url to the release page"""
-    match = re.match(util.RELEASE_HTML_PATTERN, release_url)
-    match = match or re.match(util.RELEASE_API_PATTERN, release_url)
+    match = util.RELEASE_HTML_RE.match(release_url)
+    match = match or util.RELEASE_API_RE.match(release_url)
     if not match:
         raise ValueError(f"Release url is not valid: {release_url}")
 
@@ -327,8 +326,8 @@ def extract_release(auth, dist_dir, dry_run, release_url):
 
 def parse_release_url(release_url):
     """Parse a release url into a regex match"""
-    match = re.match(util.RELEASE_HTML_PATTERN, release_url)
-    match = match or re.match(util.RELEASE_API_PATTERN, release_url)
+    match = util.RELEASE_HTML_RE.match(release_url)
+    match = match or util.RELEASE_API_RE.match(release_url)
     if not match:
         raise ValueError(f"Release url is not valid: {release_url}")
     return match
@@ -424,10 +423,8 @@ def prep_git(branch, repo, auth, username, url):
 
     branch = branch or util.get_default_branch()
 
-    util.run(f"git fetch origin {branch}")
-
-    # Make sure we have *all* tags
-    util.run("git fetch origin --tags")
+    # Fetch the branch and make sure we have *all* tags
+    util.run(f"git fetch origin {branch} --tags")
 
     util.run(f"git checkout {branch}")
 
@@ -1,14 +1,16 @@
 # Copyright (c) Jupyter Development Team.
 # Distributed under the terms of the Modified BSD License.
-import json
 import os
 import os.path as osp
 import traceback
 from pathlib import Path
+from unittest import mock
 from urllib.request import OpenerDirector
 
 from click.testing import CliRunner
 from pytest import fixture
+from pytest import MonkeyPatch
+from pytest import skip
 
 from jupyter_releaser import changelog
 from jupyter_releaser import cli
@@ -17,18 +19,12 @@ from jupyter_releaser.tests import util as testutil
 from jupyter_releaser.util import run
 
 
-@fixture(autouse=True)
-def mock_env(mocker):
-    """Clear unwanted environment variables"""
+@fixture(scope="session")
+def clean_env(pre_commit_home):
+    """The environment for the tests, computed once per session"""
     # Anything that starts with RH_ or GITHUB_
-    prefixes = ["GITHUB_", "RH_"]
-    env = os.environ.copy()
-    for key in list(env):
-        for prefix in prefixes:
-            if key.startswith(prefix):
-                del env[key]
-
-    mocker.patch.dict(os.environ, env, clear=True)
+    prefixes = ("GITHUB_", "RH_")
+    env = {k: v for k, v in os.environ.items() if not k.startswith(prefixes)}
 
     try:
         run("git config --global user.name")
@@ -36,85 +32,148 @@ def mock_env(mocker):
         run("git config --global user.name snuffy")
         run("git config --global user.email snuffy@sesame.com")
 
+    return env
+
+
+@fixture(autouse=True)
+def mock_env(mocker, clean_env):
+    """Clear unwanted environment variables"""
+    mocker.patch.dict(os.environ, clean_env, clear=True)
     yield
 
 
-@fixture
-def git_repo(tmp_path):
-    prev_dir = os.getcwd()
-    os.chdir(tmp_path)
+@fixture(autouse=True)
+def tbump_mock(request, mocker):
+    """Bump tbump.toml versions in-process unless the test is marked tbump"""
+    if request.node.get_closest_marker("tbump"):
+        yield
+        return
 
-    run("git init")
-    run("git config user.name snuffy")
-    run("git config user.email snuffy@sesame.com")
+    orig_run = util.run
+
+    def wrapped(cmd, **kwargs):
+        if cmd.startswith(util.TBUMP_CMD) and osp.exists("tbump.toml"):
+            return testutil.fake_tbump(cmd.split()[-1])
+        return orig_run(cmd, **kwargs)
 
-    run("git checkout -b foo")
-    gitignore = tmp_path / ".gitignore"
+    yield mocker.patch("jupyter_releaser.util.run", wraps=wrapped)
+
+
+@fixture(scope="session")
+def git_repo_template(tmp_path_factory):
+    """Build the base git repository once per session"""
+    path = tmp_path_factory.mktemp("git_repo")
+
+    gitignore = path / ".gitignore"
     gitignore.write_text(f"dist/*\nbuild/*\n{util.CHECKOUT_NAME}\n", encoding="utf-8")
 
-    changelog = tmp_path / "CHANGELOG.md"
-    changelog.write_text(testutil.CHANGELOG_TEMPLATE, encoding="utf-8")
+    changelog = path / "CHANGELOG.md"
+    changelog.write_bytes(testutil.CHANGELOG_TEMPLATE_BYTES)
 
-    readme = tmp_path / "README.md"
+    readme = path / "README.md"
     readme.write_text("Hello from foo project\n", encoding="utf-8")
 
-    run("git add .")
-    run('git commit -m "foo"')
-    run("git tag v0.0.1")
-    run(f"git remote add origin {util.normalize_path(tmp_path)}")
-    run("git push origin foo")
-    run("git remote set-head origin foo")
-    run("git checkout -b bar foo")
-    run("git fetch origin")
-    yield tmp_path
-    os.chdir(prev_dir)
+    origin = util.normalize_path(path)
+    testutil.run_script(
+        " && ".join(
+            [
+                "git init",
+                "git config user.name snuffy",
+                "git config user.email snuffy@sesame.com",
+                "git checkout -b foo",
+                "git add -A",
+                'git commit -m "foo"',
+                "git tag v0.0.1",
+                f'git remote add origin "{origin}"',
+                "git push origin foo",
+                "git remote set-head origin foo",
+                "git checkout -b bar foo",
+                "git fetch origin",
+            ]
+        ),
+        cwd=path,
+    )
+
+    return path
+
+
+def _build_template(tmp_path_factory, name, base_template, create):
+    """Clone a base template into a new session directory and populate it"""
+    path = tmp_path_factory.mktemp(name)
+    testutil.clone_git_template(base_template, path)
+
+    with MonkeyPatch.context() as mp:
+        mp.chdir(path)
+        create(path)
+
+    return path
+
+
+def _clone_into(template, tmp_path, monkeypatch):
+    """Clone a session template into a test directory and change into it"""
+    testutil.clone_git_template(template, tmp_path)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@fixture
+def git_repo(tmp_path, monkeypatch, git_repo_template):
+    return _clone_into(git_repo_template, tmp_path, monkeypatch)
+
+
+@fixture(scope="session")
+def py_package_template(tmp_path_factory, git_repo_template):
+    """Build the python package repository once per session"""
+    return _build_template(
+        tmp_path_factory,
+        "py_package",
+        git_repo_template,
+        testutil.create_python_package,
+    )
 
 
 @fixture
-def py_package(git_repo):
-    return testutil.create_python_package(git_repo)
+def py_package(tmp_path, monkeypatch, py_package_template):
+    return _clone_into(py_package_template, tmp_path, monkeypatch)
+
+
+@fixture(scope="session")
+def npm_package_template(tmp_path_factory, git_repo_template):
+    """Build the npm package repository once per session"""
+    if testutil.NPM is None:
+        skip("npm not available")
+    return _build_template(
+        tmp_path_factory,
+        "npm_package",
+        git_repo_template,
+        testutil.create_npm_package,
+    )
 
 
 @fixture
-def npm_package(git_repo):
-    return testutil.create_npm_package(git_repo)
+def npm_package(tmp_path, monkeypatch, npm_package_template):
+    return _clone_into(npm_package_template, tmp_path, monkeypatch)
+
+
+@fixture(scope="session")
+def workspace_package_template(tmp_path_factory, npm_package_template):
+    """Build the npm workspace repository once per session"""
+    return _build_template(
+        tmp_path_factory,
+        "workspace_package",
+        npm_package_template,
+        testutil.create_workspace_package,
+    )
 
 
 @fixture
-def workspace_package(npm_package):
-    pkg_file = npm_package / "package.json"
-    data = json.loads(pkg_file.read_text(encoding="utf-8"))
-    data["workspaces"] = dict(packages=["packages/*"])
-    data["private"] = True
-    pkg_file.write_text(json.dumps(data), encoding="utf-8")
-
-    prev_dir = Path(os.getcwd())
-    for name in ["foo", "bar", "baz"]:
-        new_dir = prev_dir / "packages" / name
-        os.makedirs(new_dir)
-        os.chdir(new_dir)
-        run("npm init -y")
-        index = new_dir / "index.js"
-        index.write_text('console.log("hello")', encoding="utf-8")
-        if name == "foo":
-            pkg_json = new_dir / "package.json"
-            sub_data = json.loads(pkg_json.read_text(encoding="utf-8"))
-            sub_data["dependencies"] = dict(bar="*")
-            pkg_json.write_text(json.dumps(sub_data), encoding="utf-8")
-        elif name == "baz":
-            pkg_json = new_dir / "package.json"
-            sub_data = json.loads(pkg_json.read_text(encoding="utf-8"))
-            sub_data["dependencies"] = dict(foo="*")
-            pkg_json.write_text(json.dumps(sub_data), encoding="utf-8")
-    os.chdir(prev_dir)
-    util.run("git add .")
-    util.run('git commit -a -m "Add workspaces"')
-    return npm_package
+def workspace_package(tmp_path, monkeypatch, workspace_package_template):
+    return _clone_into(workspace_package_template, tmp_path, monkeypatch)
 
 
 @fixture
-def py_dist(py_package, runner, mocker, build_mock, git_prep):
-    changelog_entry = testutil.mock_changelog_entry(py_package, runner, mocker)
+def py_dist(py_package, runner, build_mock, git_prep):
+    changelog_entry = testutil.mock_changelog_entry(py_package, runner)
 
     # Create the dist files
     util.run("python -m build .", cwd=util.CHECKOUT_NAME)
@@ -126,8 +185,8 @@ def py_dist(py_package, runner, mocker, build_mock, git_prep):
 
 
 @fixture
-def npm_dist(workspace_package, runner, mocker, git_prep):
-    changelog_entry = testutil.mock_changelog_entry(workspace_package, runner, mocker)
+def npm_dist(workspace_package, runner, git_prep):
+    changelog_entry = testutil.mock_changelog_entry(workspace_package, runner)
 
     # Create the dist files
     runner(["build-npm"])
@@ -138,7 +197,23 @@ def npm_dist(workspace_package, runner, mocker, git_prep):
     return workspace_package
 
 
-@fixture()
+@fixture(scope="session")
+def pre_commit_home(request, tmp_path_factory):
+    """Install the pre-commit hook environments once and share them"""
+    path = os.environ.get("PRE_COMMIT_HOME")
+    cache = getattr(request.config, "cache", None)
+    if not path and cache is not None:
+        # Keep the hook environments between sessions
+        path = cache.mkdir("pre-commit")
+    elif not path:
+        path = tmp_path_factory.mktemp("pre-commit")
+
+    with MonkeyPatch.context() as mp:
+        mp.setenv("PRE_COMMIT_HOME", str(path))
+        yield path
+
+
+@fixture(scope="session")
 def runner():
     cli_runner = CliRunner()
 
@@ -156,8 +231,9 @@ def runner():
 
 
 @fixture()
-def git_prep(runner, git_repo):
-    runner(["prep-git", "--git-url", git_repo])
+def git_prep(tmp_path, runner):
+    # Request this after the package fixture, which clones into tmp_path
+    runner(["prep-git", "--git-url", tmp_path])
 
 
 @fixture
@@ -167,6 +243,23 @@ def open_mock(mocker):
     yield open_mock
 
 
+@fixture(scope="session")
+def _patch_generate_activity():
+    """Patch the GitHub activity generator once for the whole session"""
+    patcher = mock.patch("jupyter_releaser.changelog.generate_activity_md")
+    yield patcher.start()
+    patcher.stop()
+
+
+@fixture(autouse=True)
+def mocked_gen(_patch_generate_activity):
+    """Reset the shared activity mock for each test"""
+    mocked_gen = _patch_generate_activity
+    mocked_gen.reset_mock(return_value=True, side_effect=True)
+    mocked_gen.return_value = testutil.CHANGELOG_ENTRY
+    yield mocked_gen
+
+
 @fixture
 def build_mock(mocker):
     orig_run = util.run
@@ -1,10 +1,14 @@
 # Copyright (c) Jupyter Development Team.
 # Distributed under the terms of the Modified BSD License.
+import hashlib
+import io
 import json
 import os
-import shutil
+import re
 from pathlib import Path
+from subprocess import CalledProcessError
 
+import pytest
 import toml
 
 from jupyter_releaser import changelog
@@ -19,6 +23,21 @@ def test_get_branch(git_repo):
     assert util.get_branch() == "foo"
 
 
+def test_read_head(git_repo):
+    sha = run("git rev-parse HEAD")
+    assert util._read_head() == ("bar", sha)
+    assert util._current_sha() == sha
+
+    # Refs that only exist in packed-refs
+    run("git pack-refs --all")
+    assert util._read_head() == ("bar", sha)
+
+    # Detached head
+    run(f"git checkout {sha}")
+    assert util._read_head() == (None, sha)
+    assert util.get_branch() == ""
+
+
 def test_get_repo(git_repo, mocker):
     repo = f"{git_repo.parent.name}/{git_repo.name}"
     assert util.get_repo() == repo
@@ -32,11 +51,27 @@ def test_get_version_python(py_package):
 
 def test_get_version_npm(npm_package):
     assert util.get_version() == "1.0.0"
-    npm = util.normalize_path(shutil.which("npm"))
-    run(f"{npm} version patch")
+    run(f"{testutil.NPM} version patch")
     assert util.get_version() == "1.0.1"
 
 
+@pytest.mark.skipif(os.name == "nt", reason="Uses a shell script executable")
+def test_run_relative_path_entry(tmp_path, monkeypatch):
+    exe = tmp_path / "a" / "bin" / "tool"
+    exe.parent.mkdir(parents=True)
+    exe.write_text("#!/bin/sh\necho a\n", encoding="utf-8")
+    exe.chmod(0o755)
+    tmp_path.joinpath("b").mkdir()
+
+    # A relative PATH entry only finds the tool from the first directory
+    monkeypatch.setenv("PATH", "bin")
+    monkeypatch.chdir(tmp_path / "a")
+    assert util.run("tool") == "a"
+    monkeypatch.chdir(tmp_path / "b")
+    with pytest.raises(CalledProcessError):
+        util.run("tool")
+
+
 def test_format_pr_entry(mocker, open_mock):
     data = dict(title="foo", user=dict(login="bar", html_url=testutil.HTML_URL))
     open_mock.return_value = testutil.MockHTTPResponse(data)
@@ -46,11 +81,9 @@ def test_format_pr_entry(mocker, open_mock):
     assert resp.startswith("- ")
 
 
-def test_get_changelog_version_entry(py_package, mocker):
+def test_get_changelog_version_entry(py_package, mocked_gen):
     version = util.get_version()
 
-    mocked_gen = mocker.patch("jupyter_releaser.changelog.generate_activity_md")
-    mocked_gen.return_value = testutil.CHANGELOG_ENTRY
     resp = changelog.get_version_entry("foo", "bar/baz", version)
     mocked_gen.assert_called_with(
         "bar/baz", since="v0.0.1", kind="pr", branch="foo", heading_level=2, auth=None
@@ -59,7 +92,6 @@ def test_get_changelog_version_entry(py_package, mocker):
     assert f"## {version}" in resp
     assert testutil.PR_ENTRY in resp
 
-    mocked_gen.return_value = testutil.CHANGELOG_ENTRY
     resp = changelog.get_version_entry(
         "foo", "bar/baz", version, resolve_backports=True, auth="bizz"
     )
@@ -71,17 +103,24 @@ def test_get_changelog_version_entry(py_package, mocker):
     assert testutil.PR_ENTRY in resp
 
 
-def test_compute_sha256(py_package):
-    assert len(util.compute_sha256(py_package / "CHANGELOG.md")) == 64
+def test_compute_sha256():
+    data = b"hello"
+    sha256 = util.compute_sha256(io.BytesIO(data))
+    assert len(sha256) == 64
+    assert sha256 == hashlib.sha256(data).hexdigest()
 
 
-def test_create_release_commit(py_package, build_mock):
+def test_create_release_commit(py_package, build_mock, capsys):
     util.bump_version("0.0.2a0")
     version = util.get_version()
     util.run("python -m build .")
+    capsys.readouterr()
     shas = util.create_release_commit(version)
     assert util.normalize_path("dist/foo-0.0.2a0.tar.gz") in shas
     assert util.normalize_path("dist/foo-0.0.2a0-py3-none-any.whl") in shas
+    err = capsys.readouterr().err
+    for path, sha256 in shas.items():
+        assert f"{path}: {sha256}" in err
 
 
 def test_create_release_commit_hybrid(py_package, build_mock):
@@ -90,9 +129,9 @@ def test_create_release_commit_hybrid(py_package, build_mock):
     version = util.get_version()
     testutil.create_npm_package(py_package)
     pkg_json = py_package / "package.json"
-    data = json.loads(pkg_json.read_text(encoding="utf-8"))
-    data["version"] = version
-    pkg_json.write_text(json.dumps(data, indent=4), encoding="utf-8")
+    text = pkg_json.read_text(encoding="utf-8")
+    text = re.sub(r'"version"\s*:\s*"[^"]*"', f'"version": "{version}"', text, count=1)
+    pkg_json.write_text(text, encoding="utf-8")
     txt = (py_package / "tbump.toml").read_text(encoding="utf-8")
     txt += testutil.TBUMP_NPM_TEMPLATE
     (py_package / "tbump.toml").write_text(txt, encoding="utf-8")
@@ -103,6 +142,19 @@ def test_create_release_commit_hybrid(py_package, build_mock):
     assert util.normalize_path("dist/foo-0.0.2a0.tar.gz") in shas
 
 
+def test_is_prerelease():
+    assert not util.is_prerelease("1.0.1")
+    assert not util.is_prerelease("10.20.30")
+    assert util.is_prerelease("1.0.1a0")
+    assert util.is_prerelease("1.0.1.dev1")
+    assert util.is_prerelease("1.0.1-rc0")
+    assert util.is_prerelease("1.0.1rc0")
+    assert util.is_prerelease("1.0.1.post1")
+    with pytest.raises(ValueError):
+        util.is_prerelease("2.0")
+
+
+@pytest.mark.tbump
 def test_bump_version(py_package):
     for spec in ["1.0.1", "1.0.1.dev1", "1.0.3a4"]:
         util.bump_version(spec)
@@ -1,16 +1,31 @@
 # Copyright (c) Jupyter Development Team.
 # Distributed under the terms of the Modified BSD License.
 import json
+import os
+import re
 import shutil
+import subprocess
 from pathlib import Path
+from subprocess import CalledProcessError
+
+import toml
+from build import ProjectBuilder
 
 from jupyter_releaser import changelog
 from jupyter_releaser import util
 from jupyter_releaser.util import run
-
+from jupyter_releaser.util import run_argv
 
 VERSION_SPEC = "1.0.1"
 
+# Static commands used when setting up the test packages
+GIT_CHECKOUT_FOO = ["git", "checkout", "foo"]
+GIT_CHECKOUT_BAR = ["git", "checkout", "bar"]
+GIT_PULL_BAR = ["git", "pull", "origin", "bar"]
+
+_npm = shutil.which("npm")
+NPM = util.normalize_path(_npm) if _npm else None
+
 TOML_CONFIG = """
 [hooks]
 before-build-python = "python setup.py --version"
@@ -98,6 +113,16 @@ src = "package.json"
 search = '"version": "{current_version}"'
 """
 
+NPM_PACKAGE_TEMPLATE = dict(
+    version="1.0.0",
+    main="index.js",
+    scripts=dict(test='echo "Error: no test specified" && exit 1'),
+    keywords=[],
+    author="",
+    license="ISC",
+    description="",
+)
+
 MANIFEST_TEMPLATE = """
 include *.md
 include *.toml
@@ -114,6 +139,17 @@ Initial commit
 
 {changelog.END_MARKER}
 """
+CHANGELOG_TEMPLATE_BYTES = CHANGELOG_TEMPLATE.encode("utf-8")
+
+# Files of the python test package, pre-encoded for writing
+PY_PACKAGE_FILES = {
+    "setup.py": SETUP_PY_TEMPLATE.encode("utf-8"),
+    "setup.cfg": SETUP_CFG_TEMPLATE.encode("utf-8"),
+    "tbump.toml": (TBUMP_BASE_TEMPLATE + TBUMP_PY_TEMPLATE).encode("utf-8"),
+    "pyproject.toml": PYPROJECT_TEMPLATE.encode("utf-8"),
+    "foo.py": PY_MODULE_TEMPLATE.encode("utf-8"),
+    "MANIFEST.in": MANIFEST_TEMPLATE.encode("utf-8"),
+}
 
 HTML_URL = "https://github.com/snuffy/test/releases/tag/bar"
 URL = "https://api.gihub.com/repos/snuffy/test/releases/tags/bar"
@@ -128,64 +164,160 @@ REPO_DATA = dict(
 )
 
 
-def mock_changelog_entry(package_path, runner, mocker, version_spec=VERSION_SPEC):
+def _link_or_copy(src, dst):
+    """Hard link a file, falling back to a copy across devices"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def clone_template(src, dst):
+    """Copy the contents of a template directory into an existing directory"""
+    for entry in os.scandir(src):
+        target = os.path.join(dst, entry.name)
+        if entry.name == ".git" and entry.is_dir(follow_symlinks=False):
+            # Git never modifies object files in place, so they can be shared
+            def ignore(path, names, top=entry.path):
+                # Only skip the top level object store
+                return ["objects"] if path == top else []
+
+            shutil.copytree(entry.path, target, symlinks=True, ignore=ignore)
+            shutil.copytree(
+                os.path.join(entry.path, "objects"),
+                os.path.join(target, "objects"),
+                symlinks=True,
+                copy_function=_link_or_copy,
+            )
+        elif entry.is_dir(follow_symlinks=False):
+            shutil.copytree(entry.path, target, symlinks=True)
+        else:
+            shutil.copy2(entry.path, target, follow_symlinks=False)
+
+
+def clone_git_template(src, dst):
+    """Copy a template repository and point its origin remote at the copy"""
+    clone_template(src, dst)
+    # The origin remote points back at the repository itself
+    run_argv(["git", "remote", "set-url", "origin", util.normalize_path(dst)], cwd=dst)
+
+
+def run_script(script, **kwargs):
+    """Run a chain of shell commands in a single shell process"""
+    util.log(f"+ {script}")
+    subprocess.run(script, shell=True, check=True, **kwargs)
+
+
+def git_add_commit(message, **kwargs):
+    """Stage all of the changes and commit them in a single shell call"""
+    run_script(f'git add -A && git commit -m "{message}"', **kwargs)
+
+
+def replace_in_file(path, old, new):
+    """Replace text in a file without decoding it"""
+    path = Path(path)
+    data = path.read_bytes()
+    path.write_bytes(data.replace(old.encode("utf-8"), new.encode("utf-8")))
+
+
+def fake_tbump(version_spec, config_path="tbump.toml"):
+    """Apply a tbump version bump in-process, without any git operations"""
+    config_file = Path(config_path)
+    config_text = config_file.read_text(encoding="utf-8")
+    config = toml.loads(config_text)
+    current = config["version"]["current"]
+
+    if not re.fullmatch(config["version"]["regex"], version_spec, re.VERBOSE):
+        raise CalledProcessError(1, f"tbump {version_spec}")
+
+    for item in config.get("file", []):
+        search = item.get("search", "{current_version}")
+        old = search.format(current_version=current)
+        new = search.format(current_version=version_spec)
+        path = config_file.parent / item["src"]
+        text = path.read_text(encoding="utf-8")
+        if old not in text:
+            raise CalledProcessError(1, f"tbump {version_spec}")
+        path.write_text(text.replace(old, new), encoding="utf-8")
+
+    config_text = config_text.replace(
+        f'current = "{current}"', f'current = "{version_spec}"', 1
+    )
+    config_file.write_text(config_text, encoding="utf-8")
+    return ""
+
+
+def mock_changelog_entry(package_path, runner, version_spec=VERSION_SPEC):
     runner(["bump-version", "--version-spec", version_spec])
     changelog_file = "CHANGELOG.md"
     changelog = Path(util.CHECKOUT_NAME) / changelog_file
-    mocked_gen = mocker.patch("jupyter_releaser.changelog.generate_activity_md")
-    mocked_gen.return_value = CHANGELOG_ENTRY
     runner(["build-changelog", "--changelog-path", changelog_file])
     return changelog_file
 
 
 def create_npm_package(git_repo):
-    npm = util.normalize_path(shutil.which("npm"))
-    run(f"{npm} init -y")
+    # Match the output of `npm init -y` without starting node
+    data = dict(name=git_repo.name, **NPM_PACKAGE_TEMPLATE)
+    pkg_json = git_repo / "package.json"
+    pkg_json.write_text(json.dumps(data, indent=2) + "\n", encoding="utf-8")
     git_repo.joinpath("index.js").write_text('console.log("hello")', encoding="utf-8")
-    run("git add .")
-    run('git commit -m "initial npm package"')
+    git_add_commit("initial npm package")
 
-    run("git checkout foo")
-    run("git pull origin bar")
-    run("git checkout bar")
+    run_argv(GIT_CHECKOUT_FOO)
+    run_argv(GIT_PULL_BAR)
+    run_argv(GIT_CHECKOUT_BAR)
     return git_repo
 
 
-def create_python_package(git_repo):
-    setuppy = git_repo / "setup.py"
-    setuppy.write_text(SETUP_PY_TEMPLATE, encoding="utf-8")
+def create_workspace_package(git_repo):
+    data = dict(name=git_repo.name, **NPM_PACKAGE_TEMPLATE)
+    data["workspaces"] = dict(packages=["packages/*"])
+    data["private"] = True
+    pkg_file = git_repo / "package.json"
+    pkg_file.write_text(json.dumps(data), encoding="utf-8")
+
+    # Write the sub-packages directly instead of running `npm init -y`
+    dependencies = dict(foo=dict(bar="*"), bar={}, baz=dict(foo="*"))
+    for name, deps in dependencies.items():
+        new_dir = git_repo / "packages" / name
+        os.makedirs(new_dir)
+        sub_data = dict(name=name, **NPM_PACKAGE_TEMPLATE)
+        if deps:
+            sub_data["dependencies"] = deps
+        pkg_json = new_dir / "package.json"
+        pkg_json.write_text(json.dumps(sub_data, indent=2) + "\n", encoding="utf-8")
+        index = new_dir / "index.js"
+        index.write_text('console.log("hello")', encoding="utf-8")
+    git_add_commit("Add workspaces")
+    return git_repo
 
-    setuppy = git_repo / "setup.cfg"
-    setuppy.write_text(SETUP_CFG_TEMPLATE, encoding="utf-8")
 
-    tbump = git_repo / "tbump.toml"
-    tbump.write_text(TBUMP_BASE_TEMPLATE + TBUMP_PY_TEMPLATE, encoding="utf-8")
+def create_python_package(git_repo):
+    for name, data in PY_PACKAGE_FILES.items():
+        git_repo.joinpath(name).write_bytes(data)
 
-    pyproject = git_repo / "pyproject.toml"
-    pyproject.write_text(PYPROJECT_TEMPLATE, encoding="utf-8")
+    # The test package uses the same hooks as this repository
+    here = Path(__file__).parent
+    pre_commit = here.parent.parent / ".pre-commit-config.yaml"
+    git_repo.joinpath(pre_commit.name).write_bytes(pre_commit.read_bytes())
 
-    foopy = git_repo / "foo.py"
-    foopy.write_text(PY_MODULE_TEMPLATE, encoding="utf-8")
+    git_add_commit("initial python package")
 
-    manifest = git_repo / "MANIFEST.in"
-    manifest.write_text(MANIFEST_TEMPLATE, encoding="utf-8")
+    run_argv(GIT_CHECKOUT_FOO)
+    run_argv(GIT_PULL_BAR)
+    run_argv(GIT_CHECKOUT_BAR)
 
-    here = Path(__file__).parent
-    text = here.parent.parent.joinpath(".pre-commit-config.yaml").read_text(
-        encoding="utf-8"
-    )
+    return git_repo
 
-    pre_commit = git_repo / ".pre-commit-config.yaml"
-    pre_commit.write_text(text, encoding="utf-8")
 
-    run("git add .")
-    run('git commit -m "initial python package"')
+def build_dists(pkg, outdir):
+    """Build the sdist and wheel for a package without an isolated env"""
+    builder = ProjectBuilder(str(pkg))
+    builder.build("sdist", str(outdir))
+    builder.build("wheel", str(outdir))
 
-    run("git checkout foo")
-    run("git pull origin bar")
-    run("git checkout bar")
 
-    return git_repo
+_RESPONSE_DEFAULTS = dict(id="foo", html_url=HTML_URL, url=URL, upload_url=URL)
 
 
 class MockHTTPResponse:
@@ -195,17 +327,21 @@ class MockHTTPResponse:
     def __init__(self, data=None):
         self.url = ""
         data = data or {}
-        defaults = dict(id="foo", html_url=HTML_URL, url=URL, upload_url=URL)
         if isinstance(data, list):
-            for datum in data:
-                for key in defaults:
-                    datum.setdefault(key, defaults[key])
+            data = [{**_RESPONSE_DEFAULTS, **datum} for datum in data]
         else:
-            for key in defaults:
-                data.setdefault(key, defaults[key])
-        self.data = json.dumps(data).encode("utf-8")
+            data = {**_RESPONSE_DEFAULTS, **data}
+        self._raw_data = data
+        self._data = None
         self.headers = {}
 
+    @property
+    def data(self):
+        # Only serialize the payload when the response is actually read
+        if self._data is None:
+            self._data = json.dumps(self._raw_data).encode("utf-8")
+        return self._data
+
     def __enter__(self):
         return self
 
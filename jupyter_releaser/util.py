@@ -10,7 +10,8 @@ import re
 import shlex
 import shutil
 import sys
-from glob import glob
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from subprocess import CalledProcessError
 from subprocess import check_output
@@ -24,42 +25,62 @@ SETUP_CFG = Path("setup.cfg")
 PACKAGE_JSON = Path("package.json")
 jupyter_releaser_CONFIG = Path(".jupyter-releaser.toml")
 
-BUF_SIZE = 65536
+BUF_SIZE = 1 << 20
 TBUMP_CMD = "tbump --non-interactive --only-patch"
 
 CHECKOUT_NAME = ".jupyter_releaser_checkout"
 
 RELEASE_HTML_PATTERN = (
-    "https://github.com/(?P<owner>[^/]+)/(?P<repo>[^/]+)/releases/tag/(?P<tag>.*)"
+    r"https://github\.com/(?P<owner>[^/]+)/(?P<repo>[^/]+)/releases/tag/(?P<tag>.*)"
 )
-RELEASE_API_PATTERN = "https://api.github.com/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/releases/tags/(?P<tag>.*)"
+RELEASE_API_PATTERN = r"https://api\.github\.com/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/releases/tags/(?P<tag>.*)"
+RELEASE_HTML_RE = re.compile(RELEASE_HTML_PATTERN)
+RELEASE_API_RE = re.compile(RELEASE_API_PATTERN)
+
+_FINAL_VERSION_RE = re.compile(r"\d+\.\d+\.\d+")
 
 
 def run(cmd, **kwargs):
     """Run a command as a subprocess and get the output as a string"""
+    return _run(cmd, shlex.split(cmd), **kwargs)
+
+
+@lru_cache(maxsize=64)
+def _resolve(exe, path_env, cwd):
+    """Find the full path to an executable, caching successful lookups"""
+    # The cwd is part of the key since relative PATH entries (and the
+    # current directory on Windows) can give a cwd-relative result
+    executable = shutil.which(exe, path=path_env)
+    if not executable:
+        raise CalledProcessError(1, f'Could not find executable "{exe}"')
+    return normalize_path(executable)
+
+
+def run_argv(argv, **kwargs):
+    """Run an already split command as a subprocess and get the output as a string"""
+    cmd = " ".join(shlex.quote(arg) for arg in argv)
+    return _run(cmd, list(argv), **kwargs)
+
+
+def _run(cmd, parts, **kwargs):
+    """Log and run a command given both as a string and as split parts"""
     quiet = kwargs.pop("quiet", False)
     if not quiet:
         log(f"+ {cmd}")
     else:
         kwargs.setdefault("stderr", PIPE)
 
-    parts = shlex.split(cmd)
     if "/" not in parts[0]:
-        executable = shutil.which(parts[0])
-        if not executable:
-            raise CalledProcessError(1, f'Could not find executable "{parts[0]}"')
-        parts[0] = normalize_path(executable)
+        parts[0] = _resolve(parts[0], os.environ.get("PATH"), os.getcwd())
 
     try:
-        output = check_output(parts, **kwargs).decode("utf-8").strip()
+        output = check_output(parts, encoding="utf-8", **kwargs).strip()
         print(output)
         return output
     except CalledProcessError as e:
         if quiet:
-            print(
-                "stderr:\n", e.stderr.decode("utf-8").strip(), "\n\n", file=sys.stderr
-            )
-        print("stdout:\n", e.output.decode("utf-8").strip(), "\n\n", file=sys.stderr)
+            print("stderr:\n", e.stderr.strip(), "\n\n", file=sys.stderr)
+        print("stdout:\n", e.output.strip(), "\n\n", file=sys.stderr)
         raise e
 
 
@@ -78,10 +99,48 @@ def get_branch():
         # e.g. refs/heads/feature-branch-1
         branch = os.environ["GITHUB_REF"].split("/")[-1]
     else:
-        branch = run("git branch --show-current")
+        branch = _read_head()[0] or run("git branch --show-current")
     return branch
 
 
+def _read_head(path="."):
+    """Get the current branch and commit sha by reading the git files directly.
+
+    Either value is None if it cannot be read, e.g. for a detached head,
+    an unborn branch or a worktree.
+    """
+    git_dir = Path(path) / ".git"
+    try:
+        head = git_dir.joinpath("HEAD").read_text(encoding="utf-8").strip()
+    except OSError:
+        return None, None
+
+    if not head.startswith("ref: "):
+        return None, head or None
+
+    ref = head[len("ref: ") :]
+    branch = ref[len("refs/heads/") :] if ref.startswith("refs/heads/") else None
+    try:
+        return branch, git_dir.joinpath(ref).read_text(encoding="utf-8").strip()
+    except OSError:
+        pass
+
+    # Fall back to the packed refs, e.g. after a `git gc`
+    try:
+        packed = git_dir.joinpath("packed-refs").read_text(encoding="utf-8")
+    except OSError:
+        return branch, None
+    for line in packed.splitlines():
+        if line.endswith(f" {ref}"):
+            return branch, line.split(" ", 1)[0]
+    return branch, None
+
+
+def _current_sha(path="."):
+    """Get the sha of the current commit"""
+    return _read_head(path)[1] or run("git rev-parse HEAD", cwd=path)
+
+
 def get_default_branch():
     """Get the default remote branch"""
     info = run("git remote show origin")
@@ -112,41 +171,63 @@ def get_version():
 
 
 def normalize_path(path):
-    """Normalize a path to use backslashes"""
+    """Normalize a path to use forward slashes"""
+    if os.sep == "/":
+        return str(path)
     return str(path).replace(os.sep, "/")
 
 
 def compute_sha256(path):
-    """Compute the sha256 of a file"""
+    """Compute the sha256 of a file given its path or a binary file object"""
+    if not hasattr(path, "read"):
+        with open(path, "rb", buffering=0) as f:
+            return compute_sha256(f)
+
+    if hasattr(hashlib, "file_digest"):
+        return hashlib.file_digest(path, "sha256").hexdigest()
+
     sha256 = hashlib.sha256()
+    buf = memoryview(bytearray(BUF_SIZE))
 
-    with open(path, "rb") as f:
-        while True:
-            data = f.read(BUF_SIZE)
-            if not data:
-                break
-            sha256.update(data)
+    while True:
+        size = path.readinto(buf)
+        if not size:
+            break
+        sha256.update(buf[:size])
 
     return sha256.hexdigest()
 
 
-def create_release_commit(version, dist_dir="dist"):
-    """Generate a release commit that has the sha256 digests for the release files"""
-    cmd = f'git commit -am "Publish {version}" -m "SHA256 hashes:"'
+def _list_dist(dist_dir):
+    """Get the sorted, normalized paths of the files in a dist directory"""
+    try:
+        with os.scandir(dist_dir) as entries:
+            return sorted(
+                normalize_path(entry.path)
+                for entry in entries
+                if entry.is_file() and not entry.name.startswith(".")
+            )
+    except FileNotFoundError:
+        return []
 
-    shas = dict()
 
-    files = glob(f"{dist_dir}/*")
-    if not files:  # pragma: no cover
+def create_release_commit(version, dist_dir="dist"):
+    """Generate a release commit that has the sha256 digests for the release files"""
+    paths = _list_dist(dist_dir)
+    if not paths:  # pragma: no cover
         raise ValueError("Missing distribution files")
 
-    for path in sorted(files):
-        path = normalize_path(path)
-        sha256 = compute_sha256(path)
-        shas[path] = sha256
-        cmd += f' -m "{path}: {sha256}"'
+    # Hash the files concurrently, hashlib releases the GIL on large buffers
+    with ThreadPoolExecutor(max_workers=min(8, len(paths))) as executor:
+        shas = dict(zip(paths, executor.map(compute_sha256, paths)))
 
-    run(cmd)
+    # Pass the message on stdin, matching the paragraphs of repeated -m flags
+    paragraphs = [f"Publish {version}", "SHA256 hashes:"]
+    paragraphs += [f"{path}: {sha256}" for (path, sha256) in shas.items()]
+    message = "\n\n".join(paragraphs)
+    # The command line no longer carries the hashes, so log them explicitly
+    log(message)
+    run("git commit -a -F -", input=message)
 
     return shas
 
@@ -163,11 +244,11 @@ def bump_version(version_spec, version_cmd=""):
             version_cmd = version_cmd or TBUMP_CMD
 
         if PYPROJECT.exists():
-            if "tbump" in PYPROJECT.read_text(encoding="utf-8"):
+            if b"tbump" in PYPROJECT.read_bytes():
                 version_cmd = version_cmd or TBUMP_CMD
 
         if SETUP_CFG.exists():
-            if "bumpversion" in SETUP_CFG.read_text(encoding="utf-8"):
+            if b"bumpversion" in SETUP_CFG.read_bytes():
                 version_cmd = version_cmd or "bump2version"
 
     if not version_cmd and PACKAGE_JSON.exists():
@@ -184,16 +265,17 @@ def bump_version(version_spec, version_cmd=""):
 
 def is_prerelease(version):
     """Test whether a version is a prerelease version"""
-    final_version = re.match("([0-9]+.[0-9]+.[0-9]+)", version).groups()[0]
-    return final_version != version
+    match = _FINAL_VERSION_RE.match(version)
+    if not match:
+        raise ValueError(f"Invalid version: {version}")
+    return match.group() != version
 
 
 def release_for_url(gh, url):
     """Get release response data given a release url"""
-    release = None
-    for rel in gh.repos.list_releases():
-        if rel.html_url == url or rel.url == url:
-            release = rel
+    # Draft releases have no tag yet, so they cannot be fetched by tag name
+    releases = gh.repos.list_releases()
+    release = next((r for r in releases if url in (r.html_url, r.url)), None)
     if not release:
         raise ValueError(f"No release found for url {url}")
     return release